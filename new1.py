@@ -1,94 +1,474 @@
 import streamlit as st
 import os
-from typing import List
-import pyttsx3
+from typing import List, TYPE_CHECKING
+from collections import deque
 import google.generativeai as genai
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from langchain.docstore.document import Document
 from langchain.schema.runnable import RunnableSequence
-from langchain.prompts import PromptTemplate
-import speech_recognition as sr
-from gtts import gTTS
-from playsound import playsound
+from langchain.schema import AIMessage
+from langchain.prompts import ChatPromptTemplate
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
+import hashlib
+import pickle
+import zipfile
+import re
+import unicodedata
+import threading
+import queue
+import time
+import numpy as np
+import faiss
+
+if TYPE_CHECKING:
+    import speech_recognition as sr
 
 # ------------------ Helper Functions ------------------ #
 
+TTS_CACHE_DIR = "tts_cache"
+EMBED_CACHE_PATH = "embed_cache.npz"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVFPQ_NLIST = 16
+IVFPQ_M = 48
+IVFPQ_NBITS = 8
+IVFPQ_NPROBE = 4
+# Faiss asks for ~39 training points per centroid; below that the 256-entry
+# PQ codebooks are poorly fit and HNSW is both faster and exact
+IVFPQ_MIN_VECTORS = 39 * 2 ** IVFPQ_NBITS
+LLM_BATCH_CONCURRENCY = 4
+FAISS_OMP_THREADS = max(1, (os.cpu_count() or 2) // 2)
+VAD_SAMPLE_RATE = 16000
+VAD_SAMPLE_WIDTH = 2
+VAD_FRAME_MS = 30
+_SENTENCE_END = re.compile(r"(?<=[।!?]|(?<!\d)\.)\s+")
+_MD_STRIP = re.compile(r"##|\*\*|[*•:`\-]")
+
+# Leave CPU headroom for concurrent Streamlit sessions
+faiss.omp_set_num_threads(FAISS_OMP_THREADS)
+
 @st.cache_resource
-def initialize_google_api():
-    GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY", "Your_API_KEY")
-    os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-    genai.configure(api_key=GOOGLE_API_KEY)
-    return GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+def _process_handles() -> dict:
+    # Streamlit re-executes this script on every rerun, so process-wide objects live here
+    return {
+        "embeddings": None,
+        "embeddings_lock": threading.Lock(),
+        "vector_stores": {},
+        "vector_stores_lock": threading.Lock(),
+        "principle_batchers": {},
+        "tts_executor": ThreadPoolExecutor(max_workers=2),
+        "warmed_up": False,
+        "warm_up_lock": threading.Lock(),
+    }
+
+def _get_embeddings() -> GoogleGenerativeAIEmbeddings:
+    # Configure the Google SDK once per process, not once per rerun
+    handles = _process_handles()
+    if handles["embeddings"] is None:
+        with handles["embeddings_lock"]:
+            if handles["embeddings"] is None:
+                GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY", "Your_API_KEY")
+                os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+                genai.configure(api_key=GOOGLE_API_KEY)
+                handles["embeddings"] = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    return handles["embeddings"]
+
+def _clean_codepoints(codepoints, out, line_ends):
+    # One pass over the whole text: split lines, drop control characters,
+    # collapse whitespace runs into single spaces and skip empty lines
+    n = 0
+    n_lines = 0
+    line_start = 0
+    pending_space = False
+    for c in codepoints:
+        if c == 10 or c == 13 or c == 0x85 or c == 0x2028 or c == 0x2029:
+            if n > line_start:
+                line_ends[n_lines] = n
+                n_lines += 1
+            line_start = n
+            pending_space = False
+        elif c == 32 or c == 0xA0 or c == 9 or c == 11 or c == 12:
+            pending_space = n > line_start
+        elif c < 32 or (0x7F <= c <= 0x9F):
+            continue
+        else:
+            if pending_space:
+                out[n] = 32
+                n += 1
+                pending_space = False
+            out[n] = c
+            n += 1
+    if n > line_start:
+        line_ends[n_lines] = n
+        n_lines += 1
+    return n_lines
+
+@st.cache_resource
+def _clean_codepoints_kernel():
+    # Numba is only needed when an index is built, so import and compile it on first use
+    from numba import njit
+    return njit(cache=True)(_clean_codepoints)
+
+def clean_lines(text: str) -> List[str]:
+    codepoints = np.frombuffer(unicodedata.normalize("NFC", text).encode("utf-32-le"), dtype=np.uint32)
+    out = np.empty_like(codepoints)
+    line_ends = np.empty(len(codepoints) + 1, dtype=np.int64)
+    n_lines = _clean_codepoints_kernel()(codepoints, out, line_ends)
+    if n_lines == 0:
+        return []
+    ends = line_ends[:n_lines].tolist()
+    # Cleaned lines are contiguous in out, so one decode plus slicing recovers them
+    cleaned = out[:ends[-1]].tobytes().decode("utf-32-le")
+    return [cleaned[start:end] for start, end in zip([0] + ends[:-1], ends)]
 
 def load_sandhi_principles(file_path: str) -> List[Document]:
-    documents = []
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File {file_path} not found!")
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            cleaned_line = line.strip()
-            if cleaned_line:
-                documents.append(Document(page_content=cleaned_line))
+    # Read and decode the whole file at once, then clean it in a single compiled pass
+    with open(file_path, 'rb') as file:
+        lines = clean_lines(file.read().decode('utf-8'))
+    documents = [Document(page_content=line) for line in lines]
     if not documents:
         raise ValueError("No valid Sandhi principles found in the file!")
     return documents
 
+def build_hnsw_index(vectors: np.ndarray) -> faiss.IndexHNSWFlat:
+    index = faiss.IndexHNSWFlat(vectors.shape[1], HNSW_M)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.add(vectors)
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+def build_ivfpq_index(vectors: np.ndarray) -> faiss.IndexIVFPQ:
+    quantizer = faiss.IndexFlatL2(vectors.shape[1])
+    index = faiss.IndexIVFPQ(quantizer, vectors.shape[1], IVFPQ_NLIST, IVFPQ_M, IVFPQ_NBITS)
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = IVFPQ_NPROBE
+    return index
+
+def build_index(vectors: np.ndarray) -> faiss.Index:
+    # Only corpora large enough to train good PQ codebooks are compressed
+    if len(vectors) >= IVFPQ_MIN_VECTORS and vectors.shape[1] % IVFPQ_M == 0:
+        return build_ivfpq_index(vectors)
+    return build_hnsw_index(vectors)
+
+def set_search_params(vector_store: FAISS):
+    if isinstance(vector_store.index, faiss.IndexHNSW):
+        vector_store.index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(vector_store.index, faiss.IndexIVF):
+        vector_store.index.nprobe = IVFPQ_NPROBE
+        # Single queries dominate, so parallelize over inverted lists within a query
+        vector_store.index.parallel_mode = 1
+
+def load_embedding_cache(cache_path: str, model: str) -> dict:
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with np.load(cache_path) as data:
+            # Vectors from a different embedding model are not comparable; start over
+            if "model" not in data or str(data["model"]) != model:
+                return {}
+            return dict(zip(data["hashes"].tolist(), data["vectors"]))
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        # A damaged cache only costs a full re-embed
+        return {}
+
+def save_embedding_cache(cache: dict, cache_path: str, model: str):
+    hashes = list(cache)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".npz", dir=os.path.dirname(os.path.abspath(cache_path))) as tmp:
+        np.savez(tmp, model=np.array(model), hashes=np.array(hashes), vectors=np.stack([cache[h] for h in hashes]))
+    os.replace(tmp.name, cache_path)
+
+def embed_with_cache(texts: List[str], embeddings: GoogleGenerativeAIEmbeddings, cache_path: str = EMBED_CACHE_PATH) -> np.ndarray:
+    # Only lines not seen in a previous build hit the embedding API
+    cache = load_embedding_cache(cache_path, embeddings.model)
+    hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    misses = [i for i, h in enumerate(hashes) if h not in cache]
+    if misses:
+        vectors = embeddings.embed_documents([texts[i] for i in misses])
+        for i, vector in zip(misses, vectors):
+            cache[hashes[i]] = np.asarray(vector, dtype="float32")
+        save_embedding_cache(cache, cache_path, embeddings.model)
+    return np.stack([cache[h] for h in hashes]).astype("float32")
+
 def create_vector_store(samples: List[Document], save_path: str) -> FAISS:
-    embeddings = initialize_google_api()
-    vector_store = FAISS.from_documents(samples, embeddings)
+    embeddings = _get_embeddings()
+    texts = [doc.page_content for doc in samples]
+    vectors = embed_with_cache(texts, embeddings)
+    vector_store = FAISS.from_embeddings(
+        zip(texts, vectors.tolist()),
+        embeddings,
+        metadatas=[doc.metadata for doc in samples]
+    )
+    # Swap the default flat index for a compressed or graph index
+    vector_store.index = build_index(vectors)
+    set_search_params(vector_store)
     vector_store.save_local(save_path)
     st.success(f"Vector store saved to {save_path}")
     return vector_store
 
-def get_relevant_principles(vector_store: FAISS, input_text: str, k: int = 3) -> List[str]:
-    similar_docs = vector_store.similarity_search(input_text, k=k)
-    return [doc.page_content for doc in similar_docs]
+def load_vector_store(save_path: str, embeddings: GoogleGenerativeAIEmbeddings) -> FAISS:
+    # Memory-map the index file instead of reading it fully into RAM
+    index = faiss.read_index(
+        os.path.join(save_path, "index.faiss"),
+        faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    )
+    with open(os.path.join(save_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    set_search_params(vector_store)
+    return vector_store
+
+def get_vector_store(save_path: str, file_path: str = None) -> FAISS:
+    # Load a saved index on first use, including after the resource cache is cleared.
+    # With file_path, a missing index is built from it. Both happen under one lock so
+    # concurrent sessions never embed the corpus twice or write over an index being read.
+    handles = _process_handles()
+    if save_path not in handles["vector_stores"]:
+        with handles["vector_stores_lock"]:
+            if save_path not in handles["vector_stores"]:
+                if os.path.exists(save_path):
+                    register_vector_store(save_path, load_vector_store(save_path, _get_embeddings()))
+                elif file_path is not None:
+                    st.info("Creating new vector store...")
+                    samples = load_sandhi_principles(file_path)
+                    register_vector_store(save_path, create_vector_store(samples, save_path))
+    return handles["vector_stores"].get(save_path)
+
+def register_vector_store(save_path: str, vector_store: FAISS):
+    handles = _process_handles()
+    handles["vector_stores"][save_path] = vector_store
+    batcher = handles["principle_batchers"].get(save_path)
+    if batcher is None:
+        handles["principle_batchers"][save_path] = PrincipleQueryBatcher(vector_store)
+    else:
+        batcher.vector_store = vector_store
+    get_relevant_principles.clear()
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def get_relevant_principles(save_path: str, input_text: str, k: int = 3) -> List[str]:
+    # Keyed by the index path so repeated lookups skip embedding and search;
+    # misses go through the batcher so concurrent sessions share one FAISS search
+    if get_vector_store(save_path) is None:
+        raise ValueError(f"Vector store {save_path} is not initialized.")
+    return _process_handles()["principle_batchers"][save_path].submit(input_text, k=k)
+
+def get_relevant_principles_batch(vector_store: FAISS, texts: List[str], k: int = 3) -> List[List[str]]:
+    # One embedding request and one FAISS search for all queries
+    if not texts:
+        return []
+    vectors = vector_store.embeddings.embed_documents(texts, task_type="retrieval_query")
+    _, indices = vector_store.index.search(np.asarray(vectors, dtype="float32"), k)
+    results = []
+    for row in indices:
+        principles = []
+        for i in row:
+            if i == -1:
+                continue
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            if isinstance(doc, Document):
+                principles.append(doc.page_content)
+        results.append(list(dict.fromkeys(principles)))
+    return results
+
+class PrincipleQueryBatcher:
+    # Coalesces concurrent single queries into batched FAISS searches.
+    # The consumer thread exits once idle and is restarted by the next submit,
+    # so a batcher dropped from the resource cache does not leave a thread behind.
+    def __init__(self, vector_store: FAISS, max_batch: int = 32, window: float = 0.02,
+                 timeout: float = 30.0, idle_timeout: float = 60.0):
+        self.vector_store = vector_store
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def submit(self, input_text: str, k: int = 3) -> List[str]:
+        reply = queue.Queue(maxsize=1)
+        with self._lock:
+            self._queue.put((input_text, k, reply))
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, daemon=True).start()
+        try:
+            result = reply.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Principle lookup timed out after {self.timeout}s")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._running = False
+                        return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                # Search once with the largest k, then trim each result to its own k
+                results = get_relevant_principles_batch(
+                    self.vector_store,
+                    [text for text, _, _ in batch],
+                    k=max(k for _, k, _ in batch)
+                )
+                results = [result[:k] for (_, k, _), result in zip(batch, results)]
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, _, reply), result in zip(batch, results):
+                reply.put(result)
+
+SANDHI_INSTRUCTIONS = """You are a Sanskrit linguistics assistant.
+
+Given a Sanskrit word or phrase, perform a complete Sandhi Vigraha (word separation).
+The input may contain **multiple Sandhi formations**, so please analyze the **entire word or phrase thoroughly**.
+
+Follow these steps:
+1. Split the Sanskrit correctly (Vigraha).
+2. Explain each Sandhi:
+    - Combined form
+    - Separated form
+    - Type of Sandhi
+    - Rule applied
+3. Provide the overall English translation.
+
+Use your knowledge of the Sandhi principles given with the input."""
+
+def warm_up(vector_store: FAISS, sandhi_chain: RunnableSequence):
+    # Pay one-time costs (FAISS thread pool, TLS handshakes) before the first query
+    try:
+        vector_store.similarity_search("आ", k=1)
+        sandhi_chain.last.invoke("hi")
+    except Exception:
+        pass
+
+def start_warm_up(vector_store: FAISS, sandhi_chain: RunnableSequence):
+    handles = _process_handles()
+    with handles["warm_up_lock"]:
+        if handles["warmed_up"]:
+            return
+        handles["warmed_up"] = True
+    threading.Thread(target=warm_up, args=(vector_store, sandhi_chain), daemon=True).start()
 
 @st.cache_resource
 def setup_sandhi_chain() -> RunnableSequence:
     llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3)
-    prompt_template = '''
-        You are a Sanskrit linguistics assistant.
-
-        Given a Sanskrit word or phrase, perform a complete Sandhi Vigraha (word separation). 
-        The input may contain **multiple Sandhi formations**, so please analyze the **entire word or phrase thoroughly**.
-
-        Follow these steps:
-        1. Split the Sanskrit correctly (Vigraha).
-        2. Explain each Sandhi:
-            - Combined form
-            - Separated form
-            - Type of Sandhi
-            - Rule applied
-        3. Provide the overall English translation.
-
-        Use your knowledge of the following Sandhi principles:
-        {principles}
-
-        Input:
-        {input_text}
-    '''
-    prompt = PromptTemplate(template=prompt_template, input_variables=["principles", "input_text"])
+    # Static instructions go in the system turn; only principles and input vary per call
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SANDHI_INSTRUCTIONS),
+        ("human", "Principles:\n{principles}\n\nInput: {input_text}")
+    ])
     return prompt | llm
 
-def analyze_sandhi(input_text: str, vector_store: FAISS, sandhi_chain: RunnableSequence, k: int = 3):
-    relevant_principles = get_relevant_principles(vector_store, input_text, k=k)
+def _analysis_cache_key(input_text: str) -> str:
+    return unicodedata.normalize("NFC", input_text).strip().lower()
+
+def _analysis_cache() -> dict:
+    return st.session_state.setdefault("analysis_cache", {})
+
+def render_result(placeholder, text: str):
+    placeholder.markdown("""<div class="result-box" style="background-color: #f0f2f6; border-radius: 10px; padding: 20px;">""" + text + "</div>", unsafe_allow_html=True)
+
+def analyze_sandhi(input_text: str, save_path: str, sandhi_chain: RunnableSequence, k: int = 3, placeholder=None, on_chunk=None):
+    # Repeat inputs are answered from the session cache without calling Gemini
+    cache = _analysis_cache()
+    key = _analysis_cache_key(input_text)
+    if key in cache:
+        result, relevant_principles = cache[key]
+        if placeholder is not None:
+            render_result(placeholder, result.content)
+        if on_chunk is not None:
+            on_chunk(result.content)
+        return result, relevant_principles
+    relevant_principles = get_relevant_principles(save_path, input_text, k=k)
     if not relevant_principles:
         raise ValueError("No relevant Sandhi principles found for the given input.")
-    result = sandhi_chain.invoke({
+    inputs = {
         "principles": "\n".join(relevant_principles),
         "input_text": input_text
-    })
+    }
+    if placeholder is None and on_chunk is None:
+        result = sandhi_chain.invoke(inputs)
+    else:
+        # Stream tokens into the placeholder and the callback as Gemini produces them
+        result_text = ""
+        for chunk in sandhi_chain.stream(inputs):
+            result_text += chunk.content
+            if placeholder is not None:
+                render_result(placeholder, result_text)
+            if on_chunk is not None:
+                on_chunk(chunk.content)
+        result = AIMessage(content=result_text)
+    cache[key] = (result, relevant_principles)
     return result, relevant_principles
 
+def analyze_sandhi_batch(input_texts: List[str], save_path: str, sandhi_chain: RunnableSequence, k: int = 3):
+    # Retrieve principles for every input in one batched FAISS search
+    principles_batch = get_relevant_principles_batch(get_vector_store(save_path), input_texts, k=k)
+    if not all(principles_batch):
+        raise ValueError("No relevant Sandhi principles found for the given input.")
+    # Limit parallel Gemini calls and keep failures per item, so one rate-limit
+    # error does not discard the results that succeeded
+    results = sandhi_chain.batch(
+        [
+            {"principles": "\n".join(principles), "input_text": input_text}
+            for input_text, principles in zip(input_texts, principles_batch)
+        ],
+        config={"max_concurrency": LLM_BATCH_CONCURRENCY},
+        return_exceptions=True
+    )
+    return list(zip(results, principles_batch))
+
+def trim_silence(audio: "sr.AudioData", aggressiveness: int = 2) -> "sr.AudioData":
+    # Drop leading and trailing non-speech frames so less audio is uploaded
+    import speech_recognition as sr
+    import webrtcvad
+    raw = audio.get_raw_data(convert_rate=VAD_SAMPLE_RATE, convert_width=VAD_SAMPLE_WIDTH)
+    frame_bytes = VAD_SAMPLE_RATE * VAD_FRAME_MS // 1000 * VAD_SAMPLE_WIDTH
+    vad = webrtcvad.Vad(aggressiveness)
+    speech = [
+        offset for offset in range(0, len(raw) - frame_bytes + 1, frame_bytes)
+        if vad.is_speech(raw[offset:offset + frame_bytes], VAD_SAMPLE_RATE)
+    ]
+    if not speech:
+        return audio
+    trimmed = raw[speech[0]:speech[-1] + frame_bytes]
+    return sr.AudioData(trimmed, VAD_SAMPLE_RATE, VAD_SAMPLE_WIDTH)
+
 def transcribe_audio_input():
+    # Audio dependencies are only imported once Audio mode is used
+    import speech_recognition as sr
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
         st.info("Recording... Speak now!")
         audio = recognizer.listen(source)
 
+    try:
+        audio = trim_silence(audio)
+    except Exception:
+        # VAD is only an optimization; send the untrimmed recording instead
+        pass
+
     try:
         st.success("Transcribing...")
         text = recognizer.recognize_google(audio, language="hi-IN")
@@ -100,31 +480,79 @@ def transcribe_audio_input():
         st.error(f"Could not request results; {e}")
         return ""
 
-from gtts import gTTS
-from playsound import playsound
-import tempfile
+def synthesize_speech(text: str, lang='hi') -> str:
+    from gtts import gTTS
+    from pydub import AudioSegment
 
-def speak_text(text: str, lang='hi'):
     # Remove any markdown or symbols
-    clean_text = (
-        text.replace("*", "")
-            .replace("•", "")
-            .replace(":", "")
-            .replace("`", "")
-            .replace("##", "")
-            .replace("**", "")
-            .replace("-", "")
-            .strip()
-    )
-
-    try:
+    clean_text = _MD_STRIP.sub("", text).strip()
+
+    # Reuse previously synthesized audio for identical text
+    key = hashlib.sha1((lang + clean_text).encode("utf-8")).hexdigest()
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    wav_path = os.path.join(TTS_CACHE_DIR, key + ".wav")
+    if os.path.exists(wav_path):
+        return wav_path
+    mp3_path = os.path.join(TTS_CACHE_DIR, key + ".mp3")
+    if not os.path.exists(mp3_path):
         tts = gTTS(text=clean_text, lang=lang)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3", dir=TTS_CACHE_DIR) as tmp:
             tmp_path = tmp.name
-            tts.save(tmp_path)
-            playsound(tmp_path)
-    except Exception as e:
-        st.error(f"Text-to-speech error: {e}")
+        tts.save(tmp_path)
+        os.replace(tmp_path, mp3_path)
+    # Decode here, on the TTS worker, so playback never waits on ffmpeg
+    segment = AudioSegment.from_file(mp3_path, format="mp3")
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=TTS_CACHE_DIR) as tmp:
+        tmp_path = tmp.name
+    segment.export(tmp_path, format="wav")
+    os.replace(tmp_path, wav_path)
+    return wav_path
+
+def play_audio(wav_path: str):
+    import simpleaudio
+    simpleaudio.WaveObject.from_wave_file(wav_path).play().wait_done()
+
+class SentenceSpeaker:
+    # Speaks streamed text sentence by sentence. Finished sentences are synthesized
+    # on the TTS pool and a player thread plays the clips in order, so the caller's
+    # stream loop never waits on audio.
+    def __init__(self, lang='hi'):
+        self.lang = lang
+        self._buffer = ""
+        self._executor = _process_handles()["tts_executor"]
+        self._futures = queue.Queue()
+        self._errors = []
+        self._player = threading.Thread(target=self._play, daemon=True)
+        self._player.start()
+
+    def feed(self, text: str):
+        self._buffer += text
+        *sentences, self._buffer = _SENTENCE_END.split(self._buffer)
+        for sentence in sentences:
+            self._submit(sentence)
+
+    def finish(self):
+        # Speak whatever is left, wait for playback and report errors on the script thread
+        self._submit(self._buffer)
+        self._buffer = ""
+        self._futures.put(None)
+        self._player.join()
+        if self._errors:
+            st.error(f"Text-to-speech error: {self._errors[0]}")
+
+    def _submit(self, sentence: str):
+        if _MD_STRIP.sub("", sentence).strip():
+            self._futures.put(self._executor.submit(synthesize_speech, sentence, self.lang))
+
+    def _play(self):
+        while True:
+            future = self._futures.get()
+            if future is None:
+                return
+            try:
+                play_audio(future.result())
+            except Exception as e:
+                self._errors.append(e)
 
 
 # ------------------ Main App ------------------ #
@@ -138,9 +566,21 @@ st.set_page_config(
 FILE_PATH = "sandhi_samples_v2.txt"
 SAVE_PATH = "sandhi_vigraha_index"
 K_VALUE = 3
+HISTORY_SIZE = 20
 
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=HISTORY_SIZE)
+    st.session_state.history_next_id = 0
+
+def add_to_history(input_text: str, result_text: str, principles: List[str]):
+    # Each entry gets a stable id so the selected history item survives appends and evictions
+    st.session_state.history.append({
+        "id": st.session_state.history_next_id,
+        "input": input_text,
+        "result": result_text,
+        "principles": principles
+    })
+    st.session_state.history_next_id += 1
 
 def main():
     st.markdown("""
@@ -161,17 +601,12 @@ def main():
     You can either **type** your input or **record** using a microphone.
     """)
 
-    embeddings = initialize_google_api()
-
-    if 'vector_store' not in st.session_state:
+    # The process-wide registry is the only handle on the index, so this also
+    # recovers when the resource cache is cleared mid-session
+    if SAVE_PATH not in _process_handles()["vector_stores"]:
         with st.spinner("Initializing vector store..."):
             try:
-                if os.path.exists(SAVE_PATH):
-                    st.session_state.vector_store = FAISS.load_local(SAVE_PATH, embeddings, allow_dangerous_deserialization=True)
-                else:
-                    st.info("Creating new vector store...")
-                    samples = load_sandhi_principles(FILE_PATH)
-                    st.session_state.vector_store = create_vector_store(samples, SAVE_PATH)
+                get_vector_store(SAVE_PATH, FILE_PATH)
             except Exception as e:
                 st.error(f"Error initializing vector store: {str(e)}")
                 return
@@ -180,6 +615,8 @@ def main():
         with st.spinner("Setting up AI model..."):
             st.session_state.sandhi_chain = setup_sandhi_chain()
 
+    start_warm_up(get_vector_store(SAVE_PATH), st.session_state.sandhi_chain)
+
     input_mode = st.radio("Choose input mode:", ("Text", "Audio"))
 
     input_text = ""
@@ -188,20 +625,17 @@ def main():
         if st.button("Analyze", type="primary") and input_text:
             with st.spinner("Analyzing Sandhi..."):
                 try:
+                    st.markdown("## Sandhi Analysis Result")
+                    placeholder = st.empty()
                     result, principles = analyze_sandhi(
                         input_text,
-                        st.session_state.vector_store,
+                        SAVE_PATH,
                         st.session_state.sandhi_chain,
-                        k=K_VALUE
+                        k=K_VALUE,
+                        placeholder=placeholder
                     )
-                    st.session_state.history.append({
-                        "input": input_text,
-                        "result": result.content,
-                        "principles": principles
-                    })
+                    add_to_history(input_text, result.content, principles)
                     st.success("Analysis complete!")
-                    st.markdown("## Sandhi Analysis Result")
-                    st.markdown("""<div class="result-box" style="background-color: #f0f2f6; border-radius: 10px; padding: 20px;">""" + result.content + "</div>", unsafe_allow_html=True)
 
                 except Exception as e:
                     st.error(f"Error analyzing Sandhi: {str(e)}")
@@ -213,36 +647,67 @@ def main():
                 st.success(f"Transcribed Text: {input_text}")
                 with st.spinner("Analyzing Sandhi..."):
                     try:
-                        result, principles = analyze_sandhi(
-                            input_text,
-                            st.session_state.vector_store,
-                            st.session_state.sandhi_chain,
-                            k=K_VALUE
-                        )
-                        st.session_state.history.append({
-                            "input": input_text,
-                            "result": result.content,
-                            "principles": principles
-                        })
-                        st.success("Analysis complete!")
                         st.markdown("## Sandhi Analysis Result")
-                        st.markdown("""<div class="result-box" style="background-color: #f0f2f6; border-radius: 10px; padding: 20px;">""" + result.content + "</div>", unsafe_allow_html=True)
-
-                        speak_text(result.content)
+                        placeholder = st.empty()
+                        speaker = SentenceSpeaker()
+                        try:
+                            result, principles = analyze_sandhi(
+                                input_text,
+                                SAVE_PATH,
+                                st.session_state.sandhi_chain,
+                                k=K_VALUE,
+                                placeholder=placeholder,
+                                on_chunk=speaker.feed
+                            )
+                        finally:
+                            speaker.finish()
+                        add_to_history(input_text, result.content, principles)
+                        st.success("Analysis complete!")
 
                     except Exception as e:
                         st.error(f"Error analyzing Sandhi: {str(e)}")
 
     if st.session_state.history:
         st.header("Analysis History")
-        history_tabs = st.tabs([item["input"] for item in reversed(st.session_state.history)])
-        for i, (tab, item) in enumerate(zip(history_tabs, reversed(st.session_state.history))):
-            with tab:
-                st.markdown(f"### Analysis for: {item['input']}")
-                st.markdown(item['result'])
-                if st.button(f"Reanalyze", key=f"reanalyze_{i}"):
-                    st.session_state.selected_sample = item["input"]
-                    st.rerun()
+        if len(st.session_state.history) > 1 and st.button("Reanalyze all", key="reanalyze_all"):
+            with st.spinner("Reanalyzing history..."):
+                try:
+                    analyses = analyze_sandhi_batch(
+                        [item["input"] for item in st.session_state.history],
+                        SAVE_PATH,
+                        st.session_state.sandhi_chain,
+                        k=K_VALUE
+                    )
+                    failed = 0
+                    for item, (result, principles) in zip(st.session_state.history, analyses):
+                        if isinstance(result, Exception):
+                            failed += 1
+                            continue
+                        item["result"] = result.content
+                        item["principles"] = principles
+                        _analysis_cache()[_analysis_cache_key(item["input"])] = (result, principles)
+                    if failed:
+                        st.warning(f"{failed} of {len(analyses)} entries could not be reanalyzed.")
+                except Exception as e:
+                    st.error(f"Error analyzing Sandhi: {str(e)}")
+        history = {item["id"]: item for item in reversed(st.session_state.history)}
+        if st.session_state.get("active_tab") not in history:
+            st.session_state.pop("active_tab", None)
+        # Only the selected entry is rendered; st.tabs would render every result on each rerun
+        selected_id = st.radio(
+            "History",
+            list(history),
+            format_func=lambda entry_id: history[entry_id]["input"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="active_tab"
+        )
+        item = history[selected_id]
+        st.markdown(f"### Analysis for: {item['input']}")
+        st.markdown(item['result'])
+        if st.button(f"Reanalyze", key=f"reanalyze_{selected_id}"):
+            st.session_state.selected_sample = item["input"]
+            st.rerun()
 
     # Hide footer
     st.markdown("""